@@ -1,10 +1,16 @@
 import sanitise
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import ahocorasick
 import re
 import glob
 import logging
 from typing import List, Dict
 import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from bokeh.plotting import figure, save
 from bokeh.resources import CDN
 from bokeh.embed import file_html
@@ -18,70 +24,82 @@ import json
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 # User configuration
-TARGET_USERS = ['']  # Targeted users show up in the console, showing their message count. this is used for debugging.
+TARGET_USERS = ['']  # Targeted users show up in the console, showing their message count. this is used for debugging. Names are case-sensitive.
 TOP_USERS_COUNT = 50  # Number of top users to visualize
 
+# Chat line format: [timestamp] username: message (the timestamp is not used, so it is not captured)
+# Negated character classes let the timestamp and username stop at the first delimiter without backtracking
+CHAT_LINE_PATTERN = r'^\[[^\]]+\] (?P<username>[^:]+): (?P<message>.+)'
+
+# System messages without any user content: regular subs, resubs with no custom message and bare "cheerX" bits
+SYSTEM_MESSAGE_PATTERN = (
+    r'^(?:[^:]+subscribed at Tier \d+\.'
+    r'|[^:]+subscribed at Tier \d+\. They\'ve subscribed for \d+ months?!\s*'
+    r'|\s*(?i:cheer)\d+\s*)$'
+)
+
 def parse_chat_data(file_path: str) -> pd.DataFrame:
     try:
         with open(file_path, 'r', encoding='utf-8') as file:
-            chat_data = file.readlines()
+            chat_text = file.read()
     except Exception as e:
         logging.error(f"Error reading file {file_path}: {str(e)}")
-        return pd.DataFrame(columns=['timestamp', 'username', 'message'])
-
-    pattern = re.compile(r'\[(?P<timestamp>.+?)\] (?P<username>.+?): (?P<message>.+)')
-    chat_entries = []
-
-    for line in chat_data:
-        match = pattern.match(line)
-        if match:
-            entry = match.groupdict()
-            message = entry['message']
-
-            # Filter out gift sub notifications (single and multi)
-            if "gifted a Tier 1 sub to" in message or "is gifting" in message:
-                continue
-
-            # Filter out regular sub notifications without custom message
-            if re.match(r'^[^:]+subscribed at Tier \d+\.$', message):
-                continue
-
-            # Keep resub messages only if they have custom message
-            resub_match = re.match(r'^[^:]+subscribed at Tier \d+\. They\'ve subscribed for \d+ months?!(.*)$', message)
-            if resub_match:
-                # Only keep if there's additional message content after the system message
-                if not resub_match.group(1).strip():
-                    continue
+        return pd.DataFrame(columns=['username', 'message'])
+
+    # Split into lines inside Arrow so no Python string is created per line.
+    # Arrow-backed strings also run the str.extract/contains/match calls below in C++
+    lines = pc.split_pattern(pa.array([chat_text], type=pa.large_string()), '\n').flatten()
+    # Every chat line starts with '[', so drop blank and continuation lines before running the regex
+    lines = lines.filter(pc.starts_with(lines, '['))
+    chat_data = pd.Series(pd.arrays.ArrowExtensionArray(lines))
+    del chat_text
+
+    chat_df = chat_data.str.extract(CHAT_LINE_PATTERN)
+    message = chat_df['message']
+
+    # Filter out gift sub notifications (single and multi)
+    is_gift_sub = (
+        message.str.contains("gifted a Tier 1 sub to", regex=False, na=False)
+        | message.str.contains("is gifting", regex=False, na=False)
+    )
 
-            # Filter out bits messages that are just "cheerX" without additional content
-            if re.match(r'^cheer\d+$', message.lower().strip()):
-                continue
+    # Filter out sub, resub and bits notifications in one regex pass
+    is_system_message = message.str.match(SYSTEM_MESSAGE_PATTERN, na=False)
 
-            chat_entries.append(entry)
+    # Drop unmatched lines and filtered messages in a single selection
+    keep = message.notna() & ~(is_gift_sub | is_system_message)
+    return chat_df[keep].reset_index(drop=True)
 
-    return pd.DataFrame(chat_entries)
+def concatenate_dfs(file_paths: List[str], executor: ProcessPoolExecutor) -> pd.DataFrame:
+    if not file_paths:
+        return pd.DataFrame(columns=['username', 'message'])
 
-def concatenate_dfs(file_paths: List[str]) -> pd.DataFrame:
-    dfs = []
-    for file_path in file_paths:
-        dfs.append(parse_chat_data(file_path))
-    return pd.concat(dfs, ignore_index=True)
+    # Chat files are independent, so parse them in parallel worker processes.
+    # Arrow-backed columns are concatenated as chunks, so the string data is not copied
+    return pd.concat(executor.map(parse_chat_data, file_paths), ignore_index=True)
 
 def analyze_data(chat_df: pd.DataFrame) -> pd.Series:
-    return chat_df['username'].value_counts()
+    # One hash pass to factorize usernames, then count the integer codes.
+    # A stable sort keeps tied users in order of first appearance
+    codes, users = pd.factorize(chat_df['username'])
+    counts = np.bincount(codes, minlength=len(users))
+    order = np.argsort(-counts, kind='stable')
+    return pd.Series(counts[order], index=users[order])
 
 def visualize_top_users(top_users: pd.Series, output_path: str):
-    # Create data source with formatted numbers
+    users = top_users.index.to_numpy()
+    counts = top_users.to_numpy()
+
+    # Create data source (counts are formatted by the hover tool in the browser)
     source = ColumnDataSource(data={
-        'users': top_users.index,
-        'counts': top_users.values,
-        'counts_formatted': [f"{x:,}" for x in top_users.values]
+        'users': users,
+        'counts': counts
     })
 
     # Create the figure with fixed y_range
-    max_count = max(top_users.values)
+    max_count = int(counts.max())
     p = figure(
-        x_range=top_users.index.tolist(),
+        x_range=list(users),
         y_range=(0, max_count * 1.1),
         height=600,
         width=1200,
@@ -94,7 +112,10 @@ def visualize_top_users(top_users: pd.Series, output_path: str):
     )
 
     # Add hover tooltips
-    p.add_tools(HoverTool(tooltips=[('User', '@users'), ('Messages', '@counts_formatted')]))
+    p.add_tools(HoverTool(
+        tooltips=[('User', '@users'), ('Messages', '@counts{0,0}')],
+        formatters={'@counts': 'numeral'}
+    ))
 
     # Create and style the bar chart
     p.vbar(
@@ -124,35 +145,54 @@ def visualize_top_users(top_users: pd.Series, output_path: str):
 
     # Save as HTML file
     output_html = output_path.rsplit('.', 1)[0] + '.html'
-    with open(output_html, 'w') as f:
-        f.write(file_html(p, CDN, "Chat Statistics"))
+    with open(output_html, 'wb') as f:
+        f.write(file_html(p, CDN, "Chat Statistics").encode('utf-8'))
 
 def save_user_list_to_file(message_count: pd.Series, filename: str):
     try:
-        grouped = message_count.groupby(message_count).apply(lambda x: x.index.tolist()).to_dict()
-        sorted_grouped = dict(sorted(grouped.items(), key=lambda item: item[0], reverse=True))
-
+        # Bucket users by message count in a single pass
+        grouped = defaultdict(list)
+        for user, count in zip(message_count.index.to_numpy(), message_count.to_numpy()):
+            grouped[int(count)].append(user)
+
+        lines = []
+        for count in sorted(grouped, reverse=True):
+            users = grouped[count]
+            if len(users) == 1:
+                lines.append(f"<li>{users[0]}: {count} messages</li>\n")
+            elif len(users) == 2:
+                lines.append(f"<li>{users[0]} and {users[1]}: {count} messages each</li>\n")
+            else:
+                users_str = ', '.join(users[:-1]) + f" and {users[-1]}"
+                lines.append(f"<li>{users_str}: {count} messages each</li>\n")
+
+        # Write the whole list in one call
         with open(filename, 'w', encoding='utf-8') as file:
-            for count, users in sorted_grouped.items():
-                if len(users) == 1:
-                    line = f"<li>{users[0]}: {count} messages</li>\n"
-                elif len(users) == 2:
-                    line = f"<li>{users[0]} and {users[1]}: {count} messages each</li>\n"
-                else:
-                    users_str = ', '.join(users[:-1]) + f" and {users[-1]}"
-                    line = f"<li>{users_str}: {count} messages each</li>\n"
-                file.write(line)
+            file.write(''.join(lines))
     except Exception as e:
         logging.error(f"Error writing to file {filename}: {str(e)}")
 
 def count_emote_usage(chat_df: pd.DataFrame, emotes: List[str]) -> pd.Series:
-    emote_counts = {emote: chat_df['message'].apply(lambda x: x.count(emote)).sum() for emote in emotes}
+    # Match every emote in a single pass
+    automaton = ahocorasick.Automaton()
+    for emote in emotes:
+        automaton.add_word(emote, emote)
+    automaton.make_automaton()
+
+    # Scan all messages as one buffer; emotes never contain the \x01 separator,
+    # so no match can span two messages and the counts stay exact
+    all_messages = '\x01'.join(chat_df['message'].to_numpy())
+    emote_counts = dict.fromkeys(emotes, 0)
+    for _, emote in automaton.iter(all_messages):
+        emote_counts[emote] += 1
     return pd.Series(emote_counts)
 
 def append_totals_to_file(message_count_per_user: pd.Series, filename: str):
     with open(filename, 'a', encoding='utf-8') as file:
-        file.write(f"\nTotal Messages Sent: {message_count_per_user.sum()}\n")
-        file.write(f"Total Participants: {len(message_count_per_user)}\n")
+        file.write(
+            f"\nTotal Messages Sent: {message_count_per_user.sum()}\n"
+            f"Total Participants: {len(message_count_per_user)}\n"
+        )
 
 def save_emote_usage_to_file(emote_usage: Dict[str, int], filename: str):
     try:
@@ -185,7 +225,7 @@ def save_emote_usage_to_file(emote_usage: Dict[str, int], filename: str):
     except Exception as e:
         logging.error(f"Error writing to file {filename}: {str(e)}")
 
-def process_streamer_data(streamer_path: str):
+def process_streamer_data(streamer_path: str, emotes: List[str], executor: ProcessPoolExecutor):
     """Process chat data for a single streamer."""
     streamer_name = os.path.basename(streamer_path)
     logging.info(f"Processing data for streamer: {streamer_name}")
@@ -203,22 +243,12 @@ def process_streamer_data(streamer_path: str):
         return
 
     # Create the chat DataFrame first
-    chat_df = concatenate_dfs(file_paths)
-    chat_df['timestamp'] = pd.to_datetime(chat_df['timestamp'], format="%H:%M:%S", errors='coerce')
-
-    # Load and process emotes for this specific streamer
-    try:
-        with open('emotes.json', 'r') as f:
-            streamer_emotes = json.load(f)
-    except Exception as e:
-        logging.error(f"Error loading emotes.json: {str(e)}")
-        return
+    chat_df = concatenate_dfs(file_paths, executor)
 
-    # Get emotes for this specific streamer
-    emotes = streamer_emotes.get(streamer_name, [])
+    # Process emotes for this specific streamer
     if emotes:
         emote_usage = count_emote_usage(chat_df, emotes)
-        sorted_emote_usage = dict(sorted(emote_usage.items(), key=lambda item: item[1], reverse=True))
+        sorted_emote_usage = emote_usage.sort_values(ascending=False, kind='stable').to_dict()
         save_emote_usage_to_file(sorted_emote_usage, os.path.join(output_dir, 'emote_usage.txt'))
 
     # Rest of the processing...
@@ -233,7 +263,7 @@ def process_streamer_data(streamer_path: str):
     append_totals_to_file(message_count_per_user, os.path.join(output_dir, 'user_message_counts.txt'))
 
     for user in TARGET_USERS:
-        count = message_count_per_user.get(user.lower(), 0)
+        count = message_count_per_user.get(user, 0)
         logging.info(f"Final count for {user}: {count}")
 
     # Process HTML files for this streamer
@@ -247,8 +277,19 @@ def main():
         logging.warning("No streamer directories found in chattrans/")
         return
 
-    for streamer_dir in streamer_dirs:
-        process_streamer_data(streamer_dir)
+    # Load the emotes once and hand each streamer its own list
+    try:
+        with open('emotes.json', 'r') as f:
+            streamer_emotes = json.load(f)
+    except Exception as e:
+        logging.error(f"Error loading emotes.json: {str(e)}")
+        return
+
+    # Share one worker pool across all streamers so the workers are only started once
+    with ProcessPoolExecutor() as executor:
+        for streamer_dir in streamer_dirs:
+            streamer_name = os.path.basename(streamer_dir)
+            process_streamer_data(streamer_dir, streamer_emotes.get(streamer_name, []), executor)
 
 if __name__ == "__main__":
     main()